@@ -1,21 +1,44 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, redirect, g
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import dump_options_header
 from werkzeug.utils import secure_filename
 import logging
+import os
+import unicodedata
+from urllib.parse import quote
 from config import (
     S3_BUCKET_NAME, DYNAMODB_TABLE_NAME, MAX_FILE_SIZE,
-    ALLOWED_EXTENSIONS, DEBUG
+    ALLOWED_EXTENSIONS, DEBUG, AUTO_PROVISION, ENABLE_SWAGGER, BOTO_MAX_POOL_CONNECTIONS
 )
-from services import ImageStorageService, ImageMetadataService
-import uuid
-from functools import wraps
-from io import BytesIO
+from services import ImageStorageService, ImageMetadataService, MIN_TITLE_SEARCH_LENGTH, NOT_FOUND
+import uuid6
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 from flasgger import Swagger
+import orjson
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson, falling back to Flask's defaults for other types"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 swagger_config = {
@@ -52,38 +75,69 @@ swagger_template = {
     "produces": ["application/json"],
 }
 
-Swagger(app, config=swagger_config, template=swagger_template)
+if ENABLE_SWAGGER:
+    Swagger(app, config=swagger_config, template=swagger_template)
+
+_ALLOWED_EXTENSIONS = frozenset(ALLOWED_EXTENSIONS)
+_ALLOWED_EXT_MSG = f'File type not allowed. Allowed types: {", ".join(sorted(ALLOWED_EXTENSIONS))}'
 
 # Initialize services
 storage_service = ImageStorageService(S3_BUCKET_NAME)
 metadata_service = ImageMetadataService(DYNAMODB_TABLE_NAME)
 
+# Provision AWS resources once per process instead of checking on every request
+if AUTO_PROVISION:
+    storage_service.create_bucket_if_not_exists()
+    metadata_service.create_table_if_not_exists()
+
+
+def warm_up_connections():
+    """Pay the TCP/TLS handshakes to S3 and DynamoDB up front, off the request path"""
+    storage_service.warm_up()
+    metadata_service.warm_up()
+
+
+# Runs each upload's S3 write alongside its metadata write. Sized to the shared
+# S3 client's connection pool: more concurrent uploads would only churn
+# connections, so extra ones queue here instead. The boto3 clients are
+# thread-safe, so the threads share them.
+_UPLOAD_POOL = ThreadPoolExecutor(max_workers=BOTO_MAX_POOL_CONNECTIONS, thread_name_prefix='upload')
+
+# Every get_image redirect carries a freshly signed URL, so browsers may reuse
+# the redirect for all but the last ten minutes of that URL's validity.
+_REDIRECT_URL_TTL = 3600
+_REDIRECT_MAX_AGE = _REDIRECT_URL_TTL - 600
+
 
-def validate_request():
+def validate_request(f):
     """Decorator to validate common request parameters"""
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            user_id = request.headers.get('X-User-ID')
-            if not user_id:
-                return jsonify({'error': 'X-User-ID header is required'}), 401
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_id = request.headers.get('X-User-ID')
+        if not user_id:
+            return jsonify({'error': 'X-User-ID header is required'}), 401
+        g.user_id = user_id
+        return f(*args, **kwargs)
+    return decorated_function
 
 
-def allowed_file(filename: str) -> bool:
-    """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def attachment_disposition(download_name: str) -> str:
+    """Build an attachment Content-Disposition value, RFC 5987-encoding non-ASCII names"""
+    try:
+        download_name.encode('ascii')
+        names = {'filename': download_name}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', download_name).encode('ascii', 'ignore').decode('ascii')
+        quoted = quote(download_name, safe="!#$&+^`|~")
+        names = {'filename': simple, 'filename*': f"UTF-8''{quoted}"}
+    return dump_options_header('attachment', names)
 
 
-@app.before_request
-def initialize_aws_resources():
-    """Initialize AWS resources on first request"""
-    if not hasattr(app, 'resources_initialized'):
-        storage_service.create_bucket_if_not_exists()
-        metadata_service.create_table_if_not_exists()
-        app.resources_initialized = True
+@lru_cache(maxsize=1024)
+def allowed_file(filename: str) -> bool:
+    """Check if file extension is allowed"""
+    _, dot, ext = filename.rpartition('.')
+    return bool(dot) and ext.lower() in _ALLOWED_EXTENSIONS
 
 
 @app.route('/health', methods=['GET'])
@@ -107,7 +161,7 @@ def health_check():
 
 
 @app.route('/api/v1/images/upload', methods=['POST'])
-@validate_request()
+@validate_request
 def upload_image():
     """
     Upload an image with metadata
@@ -116,6 +170,7 @@ def upload_image():
       - Images
     consumes:
       - multipart/form-data
+      - application/octet-stream
     parameters:
       - name: X-User-ID
         in: header
@@ -127,6 +182,13 @@ def upload_image():
         required: true
         type: file
         description: Image file (jpg, jpeg, png, gif, webp - max 10MB)
+      - name: filename
+        in: query
+        required: false
+        type: string
+        description: >
+          File name for raw application/octet-stream uploads, which send the
+          image as the request body and title/description/tags as query parameters
       - name: title
         in: formData
         required: false
@@ -155,38 +217,68 @@ def upload_image():
         description: Internal server error
     """
     try:
-        user_id = request.headers.get('X-User-ID')
+        user_id = g.user_id
         
-        # Validate file presence
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
+        # Reject oversize bodies from the header alone, before parsing anything
+        if request.content_length and request.content_length > MAX_FILE_SIZE:
+            return jsonify({'error': f'File too large. Max size: {MAX_FILE_SIZE / (1024*1024)}MB'}), 413
         
-        file = request.files['file']
-        if file.filename == '':
+        if request.mimetype == 'application/octet-stream':
+            # Raw body: stream it straight to S3, skipping multipart parsing and spooling
+            if not request.content_length:
+                return jsonify({'error': 'No file provided'}), 400
+            original_name = request.args.get('filename', '')
+            stream = request.stream
+            fields = request.args
+        else:
+            # Validate file presence
+            if 'file' not in request.files:
+                return jsonify({'error': 'No file provided'}), 400
+            file = request.files['file']
+            original_name = file.filename
+            stream = file.stream
+            fields = request.form
+        
+        if original_name == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if not allowed_file(file.filename):
-            return jsonify({'error': f'File type not allowed. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
+        if not allowed_file(original_name):
+            return jsonify({'error': _ALLOWED_EXT_MSG}), 400
         
-        # Read file data
-        file_data = file.read()
-        if len(file_data) > MAX_FILE_SIZE:
-            return jsonify({'error': f'File too large. Max size: {MAX_FILE_SIZE / (1024*1024)}MB'}), 413
+        if stream.seekable():
+            # Measure the spooled upload without reading it into memory
+            stream.seek(0, os.SEEK_END)
+            file_size = stream.tell()
+            stream.seek(0)
+            if file_size > MAX_FILE_SIZE:
+                return jsonify({'error': f'File too large. Max size: {MAX_FILE_SIZE / (1024*1024)}MB'}), 413
         
-        # Upload to S3
-        filename = secure_filename(file.filename)
-        s3_key = storage_service.upload_image(file_data, filename)
+        filename = secure_filename(original_name)
+        s3_key = storage_service.new_image_key(filename)
+        # UUIDv7 ids are time-ordered, so they sort by upload time like created_at
+        image_id = str(uuid6.uuid7())
+        title = fields.get('title', 'Untitled')
+        description = fields.get('description', '')
+        tags = [tag.strip() for tag in fields.get('tags', '').split(',') if tag.strip()]
         
-        if not s3_key:
-            return jsonify({'error': 'Failed to upload image to storage'}), 500
+        # The key is fixed up front, so the S3 upload and the DynamoDB write
+        # don't depend on each other and can overlap
+        upload = _UPLOAD_POOL.submit(storage_service.upload_image, stream, filename, s3_key)
+        saved = metadata_service.save_metadata(user_id, image_id, s3_key, title, description, tags)
+        try:
+            uploaded = upload.result()
+        except Exception:
+            # Unexpected errors now propagate from the service; still roll back below
+            logger.exception("Error uploading image")
+            uploaded = None
         
-        # Save metadata to DynamoDB
-        image_id = str(uuid.uuid4())
-        title = request.form.get('title', 'Untitled')
-        description = request.form.get('description', '')
-        tags = [tag.strip() for tag in request.form.get('tags', '').split(',') if tag.strip()]
+        if not uploaded:
+            # Rollback: drop the metadata pointing at the missing object
+            if saved:
+                metadata_service.delete_metadata(image_id, user_id)
+            return jsonify({'error': 'Failed to upload image to storage'}), 500
         
-        if not metadata_service.save_metadata(user_id, image_id, s3_key, title, description, tags):
+        if not saved:
             # Rollback: delete image from S3
             storage_service.delete_image(s3_key)
             return jsonify({'error': 'Failed to save image metadata'}), 500
@@ -201,13 +293,13 @@ def upload_image():
             'tags': tags
         }), 201
     
-    except Exception as e:
-        logger.error(f"Error uploading image: {str(e)}")
+    except Exception:
+        logger.exception("Error uploading image")
         return jsonify({'error': 'Internal server error'}), 500
 
 
 @app.route('/api/v1/images', methods=['GET'])
-@validate_request()
+@validate_request
 def list_images():
     """
     List images with optional filters
@@ -241,12 +333,13 @@ def list_images():
         in: query
         required: false
         type: string
-        description: Title to search (used when filter_by=title)
+        description: Case-insensitive title prefix to search, at least 2 characters (used when filter_by=title)
       - name: limit
         in: query
         required: false
         type: integer
         default: 10
+        minimum: 1
         maximum: 100
         description: Number of results to return
     responses:
@@ -260,9 +353,12 @@ def list_images():
         description: Internal server error
     """
     try:
-        user_id = request.headers.get('X-User-ID')
+        user_id = g.user_id
         filter_by = request.args.get('filter_by', 'user').lower()
-        limit = min(int(request.args.get('limit', 10)), 100)
+        limit = request.args.get('limit', '10')
+        if not limit.isdecimal() or int(limit) < 1:
+            return jsonify({'error': 'limit must be a positive integer'}), 400
+        limit = min(int(limit), 100)
         
         images = []
         
@@ -281,14 +377,16 @@ def list_images():
             title = request.args.get('title', '')
             if not title:
                 return jsonify({'error': 'title parameter required for title filter'}), 400
+            if len(title.strip()) < MIN_TITLE_SEARCH_LENGTH:
+                return jsonify({'error': f'title must be at least {MIN_TITLE_SEARCH_LENGTH} characters'}), 400
             images = metadata_service.search_images_by_title(title, limit)
         
         else:
             return jsonify({'error': 'Invalid filter_by parameter. Valid values: user, tags, title'}), 400
         
-        # Add presigned URLs for each image
-        for image in images:
-            image['url'] = storage_service.generate_presigned_url(image['s3_key'])
+        # Add presigned URLs on copies, leaving the service's (possibly cached) items untouched
+        urls = storage_service.generate_presigned_urls([image['s3_key'] for image in images])
+        images = [{**image, 'url': url} for image, url in zip(images, urls)]
         
         return jsonify({
             'count': len(images),
@@ -296,16 +394,16 @@ def list_images():
             'images': images
         }), 200
     
-    except Exception as e:
-        logger.error(f"Error listing images: {str(e)}")
+    except Exception:
+        logger.exception("Error listing images")
         return jsonify({'error': 'Internal server error'}), 500
 
 
 @app.route('/api/v1/images/<image_id>', methods=['GET'])
-@validate_request()
+@validate_request
 def get_image(image_id):
     """
-    Download/view an image by ID
+    Download/view an image by ID (redirects to a presigned S3 URL)
     ---
     tags:
       - Images
@@ -321,8 +419,8 @@ def get_image(image_id):
         type: string
         description: Image UUID
     responses:
-      200:
-        description: Image file (binary)
+      302:
+        description: Redirect to a presigned S3 URL serving the image
       401:
         description: Missing X-User-ID header
       404:
@@ -331,33 +429,38 @@ def get_image(image_id):
         description: Internal server error
     """
     try:
-        user_id = request.headers.get('X-User-ID')
+        user_id = g.user_id
         
         # Get metadata
         metadata = metadata_service.get_image_metadata(image_id, user_id)
         if not metadata:
             return jsonify({'error': 'Image not found'}), 404
         
-        # Download image from S3
-        image_data = storage_service.get_image(metadata['s3_key'])
-        if not image_data:
+        # Let the client fetch the bytes from S3 directly instead of proxying them.
+        # Not served from the URL cache: a cached URL may have too little of its
+        # validity left to back the redirect's max-age.
+        url = storage_service.generate_presigned_url(
+            metadata['s3_key'],
+            expiration=_REDIRECT_URL_TTL,
+            response_content_disposition=attachment_disposition(metadata.get('title', 'image.jpg')),
+            cached=False
+        )
+        if not url:
             return jsonify({'error': 'Failed to retrieve image'}), 500
         
-        # Return image with metadata
-        return send_file(
-            BytesIO(image_data),
-            mimetype='image/jpeg',
-            as_attachment=True,
-            download_name=metadata.get('title', 'image.jpg')
-        ), 200
+        response = redirect(url, code=302)
+        response.cache_control.private = True
+        response.cache_control.max_age = _REDIRECT_MAX_AGE
+        response.vary.add('X-User-ID')
+        return response
     
-    except Exception as e:
-        logger.error(f"Error retrieving image: {str(e)}")
+    except Exception:
+        logger.exception("Error retrieving image")
         return jsonify({'error': 'Internal server error'}), 500
 
 
 @app.route('/api/v1/images/<image_id>', methods=['DELETE'])
-@validate_request()
+@validate_request
 def delete_image(image_id):
     """
     Delete an image and its metadata
@@ -386,30 +489,30 @@ def delete_image(image_id):
         description: Internal server error
     """
     try:
-        user_id = request.headers.get('X-User-ID')
+        user_id = g.user_id
         
-        # Get metadata
-        metadata = metadata_service.get_image_metadata(image_id, user_id)
-        if not metadata:
+        # Conditionally delete the metadata; the deleted row carries the S3 key,
+        # so no separate lookup is needed
+        metadata = metadata_service.delete_metadata(image_id, user_id)
+        if metadata is NOT_FOUND:
             return jsonify({'error': 'Image not found'}), 404
+        if not metadata:
+            return jsonify({'error': 'Failed to delete image metadata'}), 500
         
-        # Delete from S3
+        # Delete from S3; an object left behind here is logged for cleanup
         if not storage_service.delete_image(metadata['s3_key']):
+            logger.warning("Orphaned S3 object %s after deleting image %s", metadata['s3_key'], image_id)
             return jsonify({'error': 'Failed to delete image from storage'}), 500
         
-        # Delete metadata from DynamoDB
-        if not metadata_service.delete_metadata(image_id, user_id):
-            return jsonify({'error': 'Failed to delete image metadata'}), 500
-        
         return jsonify({'message': 'Image deleted successfully'}), 200
     
-    except Exception as e:
-        logger.error(f"Error deleting image: {str(e)}")
+    except Exception:
+        logger.exception("Error deleting image")
         return jsonify({'error': 'Internal server error'}), 500
 
 
 @app.route('/api/v1/images/<image_id>', methods=['PUT'])
-@validate_request()
+@validate_request
 def update_image_metadata(image_id):
     """
     Update image metadata
@@ -457,12 +560,7 @@ def update_image_metadata(image_id):
         description: Internal server error
     """
     try:
-        user_id = request.headers.get('X-User-ID')
-        
-        # Verify image exists
-        metadata = metadata_service.get_image_metadata(image_id, user_id)
-        if not metadata:
-            return jsonify({'error': 'Image not found'}), 404
+        user_id = g.user_id
         
         # Get update data
         data = request.get_json() or {}
@@ -470,17 +568,33 @@ def update_image_metadata(image_id):
         description = data.get('description')
         tags = data.get('tags')
         
-        # Update metadata
-        if not metadata_service.update_metadata(image_id, user_id, title, description, tags):
+        # Update metadata; the write itself checks that the image exists
+        updated = metadata_service.update_metadata(image_id, user_id, title, description, tags)
+        if updated is NOT_FOUND:
+            return jsonify({'error': 'Image not found'}), 404
+        if not updated:
             return jsonify({'error': 'Failed to update metadata'}), 500
         
         return jsonify({'message': 'Metadata updated successfully'}), 200
     
-    except Exception as e:
-        logger.error(f"Error updating metadata: {str(e)}")
+    except Exception:
+        logger.exception("Error updating metadata")
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@app.cli.command('backfill-indexes')
+def backfill_indexes():
+    """Add the title index if missing, then index images saved before the tag and title indexes existed"""
+    if not metadata_service.ensure_title_index():
+        raise SystemExit("Adding the title index failed; see the log")
+    for name, backfill in (('Tag', metadata_service.backfill_tag_index),
+                           ('Title', metadata_service.backfill_title_index)):
+        indexed = backfill()
+        if indexed < 0:
+            raise SystemExit(f"{name} index backfill failed; see the log")
+        print(f"{name} index: {indexed} images")
+
+
 @app.errorhandler(413)
 def request_entity_too_large(error):
     """Handle file too large error"""
@@ -500,4 +614,7 @@ def internal_error(error):
 
 
 if __name__ == '__main__':
+    # The Werkzeug server handles one request at a time; it is for development only
+    if not DEBUG:
+        raise SystemExit("Serve the app with 'gunicorn -c gunicorn.conf.py' outside development")
     app.run(host='0.0.0.0', port=5000, debug=DEBUG)
@@ -5,6 +5,9 @@ load_dotenv()
 
 # AWS Configuration
 AWS_REGION = os.getenv('AWS_REGION', 'ap-south-1')
+# Point the AWS clients at LocalStack (e.g. http://localhost:4566) when set
+LOCALSTACK_ENDPOINT = os.getenv('LOCALSTACK_ENDPOINT')
+BOTO_MAX_POOL_CONNECTIONS = int(os.getenv('BOTO_MAX_POOL_CONNECTIONS', '50'))
 
 # S3 Configuration
 S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME', 'image-uploads')
@@ -13,9 +16,32 @@ MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 # DynamoDB Configuration
 DYNAMODB_TABLE_NAME = os.getenv('DYNAMODB_TABLE_NAME', 'images-metadata')
 
+# Cache Configuration
+# With REDIS_URL set, metadata is cached in Redis, which every worker shares and
+# so sees every invalidation. Without it nothing is cached unless
+# ENABLE_LOCAL_CACHE=1, which caches metadata and listings in-process: only safe
+# with a single worker, since other workers' copies outlive writes for up to the TTLs.
+REDIS_URL = os.getenv('REDIS_URL')
+ENABLE_LOCAL_CACHE = os.getenv('ENABLE_LOCAL_CACHE', '0') == '1'
+METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', '60'))
+LIST_CACHE_TTL = int(os.getenv('LIST_CACHE_TTL', '5'))
+
+# Server Configuration
+# Concurrent requests per gevent worker
+WORKER_CONNECTIONS = int(os.getenv('WORKER_CONNECTIONS', '1000'))
+
 # Flask Configuration
 FLASK_ENV = os.getenv('FLASK_ENV', 'development')
 DEBUG = FLASK_ENV == 'development'
+ENABLE_SWAGGER = os.getenv('ENABLE_SWAGGER', '1') == '1'
+
+# Create the S3 bucket and DynamoDB tables at startup (disable in production).
+# With it off, the bucket, the metadata table and its "<table>-tags" tag index
+# table must already exist: saves, deletes and tag updates write to all of them.
+# Run "flask --app app backfill-indexes" once after adding the tags table: it
+# also adds the title search index to an older metadata table (waiting for the
+# build), then indexes images saved before either index existed.
+AUTO_PROVISION = os.getenv('AUTO_PROVISION', '1') == '1'
 
 # Supported image formats
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
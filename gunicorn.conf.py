@@ -0,0 +1,12 @@
+"""Gunicorn settings: gevent workers multiplex many in-flight AWS calls each"""
+import multiprocessing
+import os
+
+from config import WORKER_CONNECTIONS
+
+wsgi_app = 'wsgi:app'
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+worker_class = 'gevent'
+worker_connections = WORKER_CONNECTIONS
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
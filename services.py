@@ -1,50 +1,253 @@
 import boto3
-from botocore.exceptions import ClientError
-from config import AWS_REGION
-from typing import Optional, List, Dict, Any
-import uuid
-from datetime import datetime
+from boto3.s3.transfer import TransferConfig
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError, NoCredentialsError
+from botocore.response import StreamingBody
+from botocore.utils import check_dns_name
+from s3transfer.manager import TransferManager
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TLRUCache, TTLCache
+from config import (
+    AWS_REGION, LOCALSTACK_ENDPOINT, BOTO_MAX_POOL_CONNECTIONS, MAX_FILE_SIZE,
+    REDIS_URL, ENABLE_LOCAL_CACHE, METADATA_CACHE_TTL, LIST_CACHE_TTL
+)
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, BinaryIO, Iterable, Iterator, Tuple, Union
+from io import BytesIO
+from functools import lru_cache
+from urllib.parse import quote, urlsplit
+import hashlib
+import hmac
+import http.client
+import itertools
+import json
+import random
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
 import logging
 
+if TYPE_CHECKING:
+    import redis
+
 logger = logging.getLogger(__name__)
 
+# http.client sends request bodies in 8KB blocks, re-acquiring the GIL for
+# every block. Raise the default so multi-MB parts go out in 1MB writes.
+HTTP_BLOCKSIZE = 1024 * 1024
+http.client.HTTPConnection.__init__.__defaults__ = tuple(
+    HTTP_BLOCKSIZE if default == 8192 else default
+    for default in http.client.HTTPConnection.__init__.__defaults__
+)
+
+# Objects below the threshold go out in a single call on the caller's thread
+# (greenlet under gevent). Larger ones are split into parts by the process-wide
+# transfer manager, whose pools are sized like the client's connection pool so
+# concurrent multipart transfers don't queue behind a handful of threads.
+_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=BOTO_MAX_POOL_CONNECTIONS,
+    use_threads=True
+)
+
+# Fans out independent per-key S3 calls; sized to stay within the client's
+# connection pool so workers never wait on a free connection.
+_IO_POOL = ThreadPoolExecutor(max_workers=min(32, BOTO_MAX_POOL_CONNECTIONS))
+
+# Clients are built once per process from boto3's default session, under a
+# lock so concurrent first requests don't race to build duplicates. Low-level
+# clients are thread-safe, so request threads share them (and their pooled
+# keep-alive connections) instead of each paying for a new TCP/TLS handshake.
+_CLIENT_CONFIG = Config(
+    max_pool_connections=BOTO_MAX_POOL_CONNECTIONS,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    tcp_keepalive=True
+)
+_CLIENT_KWARGS = {
+    'region_name': AWS_REGION,
+    'endpoint_url': LOCALSTACK_ENDPOINT,
+    'config': _CLIENT_CONFIG
+}
+
 
 class AWSClientFactory:
     """Factory for creating AWS service clients"""
     
     _s3_client = None
     _dynamodb_client = None
-    _dynamodb_resource = None
+    _lock = threading.Lock()
     
-    @staticmethod
-    def get_s3_client():
+    @classmethod
+    def reset(cls):
+        """Drop the cached clients so the next get_* call builds fresh ones"""
+        with cls._lock:
+            cls._s3_client = None
+            cls._dynamodb_client = None
+    
+    @classmethod
+    def get_s3_client(cls):
         """Get or create S3 client"""
-        if AWSClientFactory._s3_client is None:
-            AWSClientFactory._s3_client = boto3.client(
-                's3',
-                region_name=AWS_REGION
-            )
-        return AWSClientFactory._s3_client
+        if cls._s3_client is None:
+            with cls._lock:
+                if cls._s3_client is None:
+                    cls._s3_client = boto3.client('s3', **_CLIENT_KWARGS)
+        return cls._s3_client
     
-    @staticmethod
-    def get_dynamodb_client():
+    @classmethod
+    def get_dynamodb_client(cls):
         """Get or create DynamoDB client"""
-        if AWSClientFactory._dynamodb_client is None:
-            AWSClientFactory._dynamodb_client = boto3.client(
-                'dynamodb',
-                region_name=AWS_REGION
-            )
-        return AWSClientFactory._dynamodb_client
+        if cls._dynamodb_client is None:
+            with cls._lock:
+                if cls._dynamodb_client is None:
+                    cls._dynamodb_client = boto3.client('dynamodb', **_CLIENT_KWARGS)
+        return cls._dynamodb_client
+
+
+# Content types for the allowed image extensions
+_MIME_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+}
+
+
+def content_type_for(file_name: str) -> str:
+    """Map a file name or S3 key to the content type of its extension"""
+    return _MIME_TYPES.get(file_name.rpartition('.')[2].lower(), 'application/octet-stream')
+
+
+def _utcnow_iso() -> str:
+    """Current UTC time as a timezone-aware ISO 8601 string of fixed width"""
+    # Always printing microseconds keeps timestamps sorting correctly as strings
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds')
+
+
+# Batch calls retry throttled (unprocessed) keys this many times in total
+_BATCH_MAX_ATTEMPTS = 5
+
+# Title search index; tables created before it existed get it added in place
+_TITLE_INDEX_NAME = 'title_prefix-title_sort-index'
+_TITLE_INDEX = {
+    'IndexName': _TITLE_INDEX_NAME,
+    'KeySchema': [
+        {'AttributeName': 'title_prefix', 'KeyType': 'HASH'},
+        {'AttributeName': 'title_sort', 'KeyType': 'RANGE'}
+    ],
+    'Projection': {'ProjectionType': 'ALL'},
+    'ProvisionedThroughput': {
+        'ReadCapacityUnits': 5,
+        'WriteCapacityUnits': 5
+    }
+}
+# Complementing each hex digit reverses a UUIDv7's time order, so titles sorted
+# ascending list equal titles newest first
+_NEWEST_FIRST = str.maketrans('0123456789abcdef', 'fedcba9876543210')
+# Title searches are scoped to the two-character title_prefix partition
+MIN_TITLE_SEARCH_LENGTH = 2
+_TITLE_INDEX_ATTRIBUTES = [
+    {'AttributeName': 'title_prefix', 'AttributeType': 'S'},
+    {'AttributeName': 'title_sort', 'AttributeType': 'S'}
+]
+
+
+def _batched(iterable: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class _NotFound:
+    """Type of NOT_FOUND, returned by conditional writes whose target item does not exist"""
     
-    @staticmethod
-    def get_dynamodb_resource():
-        """Get or create DynamoDB resource"""
-        if AWSClientFactory._dynamodb_resource is None:
-            AWSClientFactory._dynamodb_resource = boto3.resource(
-                'dynamodb',
-                region_name=AWS_REGION
-            )
-        return AWSClientFactory._dynamodb_resource
+    def __repr__(self) -> str:
+        return 'NOT_FOUND'
+
+
+NOT_FOUND = _NotFound()
+
+_redis_client = None
+# Errors from the optional Redis cache; catches nothing until Redis is configured
+_REDIS_ERRORS: Tuple[type, ...] = ()
+
+
+def get_redis_client() -> Optional['redis.Redis']:
+    """Get or create the shared Redis cache client, or None when REDIS_URL is unset"""
+    global _redis_client, _REDIS_ERRORS
+    if _redis_client is None and REDIS_URL:
+        # Imported on first use: redis drags in its asyncio client, which every
+        # process (and test collection) would otherwise pay for at startup
+        import redis
+        _REDIS_ERRORS = (redis.RedisError,)
+        _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def _remaining_size(fileobj: BinaryIO) -> Optional[int]:
+    """Bytes left to read in a seekable file object, None if it can't seek"""
+    if not fileobj.seekable():
+        return None
+    position = fileobj.tell()
+    size = fileobj.seek(0, 2) - position
+    fileobj.seek(position)
+    return size
+
+
+def _presigned_url_ttu(key, variants, now):
+    """Keep an object's cached URLs until the last of them retires"""
+    return max(retire_at for _, retire_at in variants.values())
+
+
+@lru_cache(maxsize=16)
+def _sigv4_signing_key(secret_key: str, datestamp: str, region: str) -> bytes:
+    """Derive the SigV4 S3 signing key, which only changes daily per credential and region"""
+    key = ('AWS4' + secret_key).encode()
+    for part in (datestamp, region, 's3', 'aws4_request'):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return key
+
+
+def _uri_encode(value: str) -> str:
+    return quote(value, safe='-_.~')
+
+
+def sigv4_presign_url(base_url: str, path: str, region: str, credentials,
+                      params: Dict[str, str], expiration: int,
+                      now: Optional[datetime] = None) -> str:
+    """
+    Presign an S3 GET with SigV4 query authentication, computed locally without botocore
+    Returns: the URL, with X-Amz-Signature as its last query parameter
+    """
+    now = now or datetime.now(timezone.utc)
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    query = {
+        **params,
+        'X-Amz-Algorithm': 'AWS4-HMAC-SHA256',
+        'X-Amz-Credential': f"{credentials.access_key}/{scope}",
+        'X-Amz-Date': amz_date,
+        'X-Amz-Expires': str(expiration),
+        'X-Amz-SignedHeaders': 'host'
+    }
+    if credentials.token:
+        query['X-Amz-Security-Token'] = credentials.token
+    canonical_uri = quote(path, safe='/~')
+    canonical_query = '&'.join(f"{_uri_encode(k)}={_uri_encode(v)}" for k, v in sorted(query.items()))
+    canonical_request = '\n'.join([
+        'GET', canonical_uri, canonical_query,
+        f"host:{urlsplit(base_url).netloc}\n", 'host', 'UNSIGNED-PAYLOAD'
+    ])
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest()
+    ])
+    signing_key = _sigv4_signing_key(credentials.secret_key, amz_date[:8], region)
+    signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return f"{base_url}{canonical_uri}?{canonical_query}&X-Amz-Signature={signature}"
 
 
 class ImageStorageService:
@@ -53,279 +256,829 @@ class ImageStorageService:
     def __init__(self, bucket_name: str):
         self.bucket_name = bucket_name
         self.s3_client = AWSClientFactory.get_s3_client()
+        # One long-lived transfer manager for multipart transfers, so they reuse
+        # its thread pools instead of upload_fileobj/download_fileobj building new ones
+        self._transfer = TransferManager(self.s3_client, _TRANSFER_CONFIG)
+        # Presigning is pure CPU (SigV4 HMAC chain); reuse a URL for most of
+        # its validity so repeated listings of the same image skip re-signing.
+        # Keyed by S3 key, each holding {(expiration, disposition): (url, retire_at)},
+        # so a delete evicts every variant of an object in one step.
+        self._url_cache = TLRUCache(maxsize=100_000, ttu=_presigned_url_ttu)
+        self._url_cache_lock = threading.Lock()
+        # Presigned URLs are built by sigv4_presign_url on the client's own
+        # endpoint (so the partition's DNS suffix, e.g. amazonaws.com.cn, carries
+        # over): virtual-hosted, or path-style for custom endpoints and bucket
+        # names that aren't DNS-compatible (dotted names break virtual-hosted TLS)
+        endpoint = urlsplit(self.s3_client.meta.endpoint_url)
+        if LOCALSTACK_ENDPOINT or not check_dns_name(bucket_name):
+            self._presign_base = f"{endpoint.scheme}://{endpoint.netloc}"
+            self._presign_prefix = f"/{bucket_name}/"
+        else:
+            self._presign_base = f"{endpoint.scheme}://{bucket_name}.{endpoint.netloc}"
+            self._presign_prefix = '/'
+        # Resolved through the same default chain as the client; refreshable
+        # credentials (assumed roles) renew themselves when frozen for a signature
+        self._credentials = boto3.Session().get_credentials()
     
     def create_bucket_if_not_exists(self) -> bool:
         """Create S3 bucket if it doesn't exist"""
         try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-            logger.info(f"Bucket {self.bucket_name} already exists")
+            # Creating outright saves a probe round trip; an existing bucket just errors
+            kwargs = {'Bucket': self.bucket_name}
+            if AWS_REGION != 'us-east-1':
+                kwargs['CreateBucketConfiguration'] = {'LocationConstraint': AWS_REGION}
+            self.s3_client.create_bucket(**kwargs)
+            logger.info("Created bucket %s", self.bucket_name)
             return True
         except ClientError as e:
-            # If the bucket doesn't exist, create it. Otherwise log and fail.
-            error_code = e.response.get('Error', {}).get('Code')
-            if error_code in ("404", "NoSuchBucket", "NotFound"):
-                try:
-                    self.s3_client.create_bucket(Bucket=self.bucket_name)
-                    logger.info(f"Created bucket {self.bucket_name}")
-                    return True
-                except ClientError as ce:
-                    logger.error(f"Error creating bucket: {str(ce)}")
-                    return False
-            logger.error(f"Error checking bucket existence: {str(e)}")
+            code = e.response.get('Error', {}).get('Code')
+            if code == 'BucketAlreadyOwnedByYou':
+                logger.info("Bucket %s already exists", self.bucket_name)
+                return True
+            if code == 'BucketAlreadyExists':
+                # Bucket names are global: this one belongs to another account
+                logger.error("Bucket name %s is taken by another account", self.bucket_name)
+                return False
+            logger.error("Error creating bucket: %s", e)
+            return False
+        except BotoCoreError as e:
+            logger.error("Error creating bucket: %s", e)
             return False
     
-    def upload_image(self, image_data: bytes, file_name: str) -> Optional[str]:
+    def warm_up(self) -> None:
+        """Open a pooled connection to the bucket's endpoint before the first request needs it"""
+        try:
+            self.s3_client.head_bucket(Bucket=self.bucket_name)
+        except (ClientError, BotoCoreError) as e:
+            logger.warning("Error warming up S3 connection: %s", e)
+    
+    @staticmethod
+    def new_image_key(file_name: str) -> str:
+        """Generate a fresh S3 key for an uploaded file under a random 96-bit prefix"""
+        return f"images/{secrets.token_hex(12)}/{file_name}"
+    
+    def upload_image(self, image_data: Union[bytes, BinaryIO], file_name: str,
+                     s3_key: Optional[str] = None) -> Optional[str]:
         """
-        Upload image to S3
+        Upload image to S3, streaming file-like objects without buffering them
         Returns: S3 object key if successful, None otherwise
         """
         try:
-            s3_key = f"images/{uuid.uuid4()}/{file_name}"
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=image_data,
-                ContentType='image/jpeg'
-            )
-            logger.info(f"Uploaded image to {s3_key}")
+            s3_key = s3_key or self.new_image_key(file_name)
+            fileobj = BytesIO(image_data) if isinstance(image_data, bytes) else image_data
+            extra_args = {'ContentType': content_type_for(file_name)}
+            size = _remaining_size(fileobj)
+            if size is not None and size < _TRANSFER_CONFIG.multipart_threshold:
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=s3_key, Body=fileobj, **extra_args)
+            else:
+                # Large or unsized (non-seekable) streams: multipart via the shared manager
+                self._transfer.upload(fileobj, self.bucket_name, s3_key, extra_args=extra_args).result()
+            logger.info("Uploaded image to %s", s3_key)
             return s3_key
-        except Exception as e:
-            logger.error(f"Error uploading image: {str(e)}")
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error uploading image: %s", e)
+            return None
+    
+    def generate_presigned_upload(self, file_name: str, expiration: int = 3600) -> Optional[Dict[str, Any]]:
+        """
+        Generate a presigned POST so a client can upload straight to S3, capped at MAX_FILE_SIZE
+        Returns: dict with the url, form fields and s3_key, None on error
+        """
+        try:
+            s3_key = self.new_image_key(file_name)
+            content_type = content_type_for(file_name)
+            post = self.s3_client.generate_presigned_post(
+                self.bucket_name,
+                s3_key,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', 1, MAX_FILE_SIZE]
+                ],
+                ExpiresIn=expiration
+            )
+            return {**post, 's3_key': s3_key}
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error generating presigned upload: %s", e)
             return None
     
     def delete_image(self, s3_key: str) -> bool:
         """Delete image from S3"""
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
-            logger.info(f"Deleted image {s3_key}")
+            # Stop handing out URLs for the deleted object
+            with self._url_cache_lock:
+                self._url_cache.pop(s3_key, None)
+            logger.info("Deleted image %s", s3_key)
             return True
-        except Exception as e:
-            logger.error(f"Error deleting image: {str(e)}")
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error deleting image: %s", e)
             return False
     
     def get_image(self, s3_key: str) -> Optional[bytes]:
         """Download image from S3"""
         try:
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
-            return response['Body'].read()
-        except Exception as e:
-            logger.error(f"Error retrieving image: {str(e)}")
+            # The first range covers most objects whole; its bytes are kept either way
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=s3_key,
+                Range=f"bytes=0-{_TRANSFER_CONFIG.multipart_threshold - 1}"
+            )
+            with response['Body'] as body:
+                data = body.read()
+            size = int(response['ContentRange'].rpartition('/')[2])
+            if len(data) < size:
+                # Uploads are capped at MAX_FILE_SIZE, so the rest is one modest
+                # range; If-Match fails it if the object changed in between
+                response = self.s3_client.get_object(
+                    Bucket=self.bucket_name, Key=s3_key,
+                    Range=f"bytes={len(data)}-", IfMatch=response['ETag']
+                )
+                with response['Body'] as body:
+                    data += body.read()
+            return data
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'InvalidRange':
+                return b''  # S3 rejects any range of an empty object
+            logger.error("Error retrieving image: %s", e)
+            return None
+        except BotoCoreError as e:
+            logger.error("Error retrieving image: %s", e)
             return None
     
-    def generate_presigned_url(self, s3_key: str, expiration: int = 3600) -> Optional[str]:
-        """Generate presigned URL for image access"""
+    def get_image_stream(self, s3_key: str) -> Optional[StreamingBody]:
+        """
+        Open an image in S3 for streaming, e.g. via iter_chunks(), without buffering it
+        Returns: the unread response body, None on error
+        """
         try:
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': s3_key},
-                ExpiresIn=expiration
+            return self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)['Body']
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error opening image stream: %s", e)
+            return None
+    
+    def get_images(self, s3_keys: List[str]) -> List[Optional[bytes]]:
+        """
+        Download many images concurrently over the shared S3 client
+        Returns: image bytes (or None on failure) for each key, in order
+        """
+        return list(_IO_POOL.map(self.get_image, s3_keys))
+    
+    def _cached_url(self, s3_key: str, variant: Tuple[int, Optional[str]], now: float) -> Optional[str]:
+        """Look up a cached URL until 5/6 of its validity has passed; call with _url_cache_lock held"""
+        url, retire_at = self._url_cache.get(s3_key, {}).get(variant, (None, 0))
+        return url if retire_at > now else None
+    
+    def generate_presigned_url(self, s3_key: str, expiration: int = 3600,
+                               response_content_disposition: Optional[str] = None,
+                               cached: bool = True) -> Optional[str]:
+        """
+        Generate presigned URL for image access, reusing a cached one while still fresh
+        Returns: the URL (valid for the full expiration only when cached=False), or None on error
+        """
+        variant = (expiration, response_content_disposition)
+        if cached:
+            with self._url_cache_lock:
+                url = self._cached_url(s3_key, variant, time.monotonic())
+            if url is not None:
+                return url
+        try:
+            # Override the stored type, which was always image/jpeg for older uploads
+            params = {'response-content-type': content_type_for(s3_key)}
+            if response_content_disposition:
+                params['response-content-disposition'] = response_content_disposition
+            # Signed here rather than through botocore's presign event chain
+            if self._credentials is None:
+                raise NoCredentialsError()
+            url = sigv4_presign_url(
+                self._presign_base,
+                self._presign_prefix + s3_key,
+                self.s3_client.meta.region_name,
+                self._credentials.get_frozen_credentials(),
+                params,
+                expiration
             )
+            now = time.monotonic()
+            with self._url_cache_lock:
+                # Reassigned rather than mutated, so the cache re-reads the expiry
+                variants = {v: entry for v, entry in self._url_cache.get(s3_key, {}).items()
+                            if entry[1] > now}
+                variants[variant] = (url, now + expiration * 5 / 6)
+                self._url_cache[s3_key] = variants
             return url
-        except Exception as e:
-            logger.error(f"Error generating presigned URL: {str(e)}")
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error generating presigned URL: %s", e)
             return None
 
+    def generate_presigned_urls(self, s3_keys: List[str], expiration: int = 3600) -> List[Optional[str]]:
+        """
+        Generate presigned URLs for many images, reading the URL cache under a single lock
+        Returns: URLs in key order (None for any key that failed to sign)
+        """
+        now = time.monotonic()
+        with self._url_cache_lock:
+            urls = [self._cached_url(s3_key, (expiration, None), now) for s3_key in s3_keys]
+        # Signing is local CPU work, so misses are signed inline rather than on a pool
+        return [url if url is not None else self.generate_presigned_url(s3_key, expiration)
+                for s3_key, url in zip(s3_keys, urls)]
+
 
 class ImageMetadataService:
     """Service for handling image metadata in DynamoDB"""
     
     def __init__(self, table_name: str):
         self.table_name = table_name
-        self.dynamodb = AWSClientFactory.get_dynamodb_resource()
+        # (user_id#tag, created_at#image_id) rows, so tag search is a key query
+        self.tags_table_name = f"{table_name}-tags"
+        # The low-level client only; items are (de)serialized here rather than
+        # through a second, resource-layer copy of the service model
         self.dynamodb_client = AWSClientFactory.get_dynamodb_client()
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+        self.redis = get_redis_client()
+        # Process-local caches, opt-in and only without Redis: writes in one
+        # gunicorn worker can't invalidate another worker's copy, whereas Redis is
+        # shared. TTLCache is not thread-safe
+        self._local_caching = self.redis is None and ENABLE_LOCAL_CACHE
+        self._metadata_cache = TTLCache(maxsize=10_000, ttl=METADATA_CACHE_TTL)
+        self._list_cache = TTLCache(maxsize=1_000, ttl=LIST_CACHE_TTL)
+        self._cache_lock = threading.Lock()
     
-    def create_table_if_not_exists(self) -> bool:
-        """Create DynamoDB table if it doesn't exist"""
+    def _serialize(self, item: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        return {name: self._serializer.serialize(value) for name, value in item.items()}
+    
+    def _deserialize(self, item: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        return {name: self._deserializer.deserialize(value) for name, value in item.items()}
+    
+    @staticmethod
+    def _key(image_id: str, user_id: str) -> Dict[str, Dict[str, str]]:
+        """Build the typed primary key directly, skipping the serializer"""
+        return {'image_id': {'S': image_id}, 'user_id': {'S': user_id}}
+    
+    def _redis_key(self, image_id: str, user_id: str) -> str:
+        return f"img:{user_id}:{image_id}"
+    
+    def _invalidate(self, user_id: str, image_id: Optional[str] = None) -> None:
+        """Drop cached metadata for an image and every cached listing of its owner"""
+        with self._cache_lock:
+            if image_id is not None:
+                self._metadata_cache.pop((image_id, user_id), None)
+            for key in [k for k in self._list_cache if k[0] == user_id]:
+                self._list_cache.pop(key, None)
+        if self.redis is not None and image_id is not None:
+            try:
+                self.redis.delete(self._redis_key(image_id, user_id))
+            except _REDIS_ERRORS as e:
+                logger.error("Error invalidating cached metadata: %s", e)
+    
+    def warm_up(self) -> None:
+        """Open a pooled connection to DynamoDB before the first request needs it"""
+        try:
+            self.dynamodb_client.describe_table(TableName=self.table_name)
+        except (ClientError, BotoCoreError) as e:
+            logger.warning("Error warming up DynamoDB connection: %s", e)
+    
+    def _ensure_table(self, table_name: str, **schema) -> bool:
+        """Create a DynamoDB table with the given schema if it doesn't exist"""
         try:
-            self.dynamodb.Table(self.table_name).table_status
-            logger.info(f"Table {self.table_name} already exists")
+            # Creating outright saves a probe round trip; an existing table just errors
+            self.dynamodb_client.create_table(TableName=table_name, **schema)
+            self.dynamodb_client.get_waiter('table_exists').wait(TableName=table_name)
+            logger.info("Created table %s", table_name)
             return True
-        except ClientError:
-            try:
-                table = self.dynamodb.create_table(
-                    TableName=self.table_name,
-                    KeySchema=[
-                        {'AttributeName': 'image_id', 'KeyType': 'HASH'},
-                        {'AttributeName': 'user_id', 'KeyType': 'RANGE'}
-                    ],
-                    AttributeDefinitions=[
-                        {'AttributeName': 'image_id', 'AttributeType': 'S'},
-                        {'AttributeName': 'user_id', 'AttributeType': 'S'},
-                        {'AttributeName': 'created_at', 'AttributeType': 'S'},
-                        {'AttributeName': 'title', 'AttributeType': 'S'}
-                    ],
-                    GlobalSecondaryIndexes=[
-                        {
-                            'IndexName': 'user_id-created_at-index',
-                            'KeySchema': [
-                                {'AttributeName': 'user_id', 'KeyType': 'HASH'},
-                                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
-                            ],
-                            'Projection': {'ProjectionType': 'ALL'},
-                            'ProvisionedThroughput': {
-                                'ReadCapacityUnits': 5,
-                                'WriteCapacityUnits': 5
-                            }
-                        },
-                        {
-                            'IndexName': 'title-created_at-index',
-                            'KeySchema': [
-                                {'AttributeName': 'title', 'KeyType': 'HASH'},
-                                {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
-                            ],
-                            'Projection': {'ProjectionType': 'ALL'},
-                            'ProvisionedThroughput': {
-                                'ReadCapacityUnits': 5,
-                                'WriteCapacityUnits': 5
-                            }
-                        }
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ResourceInUseException':
+                logger.info("Table %s already exists", table_name)
+                return True
+            logger.error("Error creating table: %s", e)
+            return False
+        except BotoCoreError as e:
+            logger.error("Error creating table: %s", e)
+            return False
+    
+    def create_table_if_not_exists(self) -> bool:
+        """Create the metadata table and its tag index table if they don't exist"""
+        created = self._ensure_table(
+            self.table_name,
+            KeySchema=[
+                {'AttributeName': 'image_id', 'KeyType': 'HASH'},
+                {'AttributeName': 'user_id', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'image_id', 'AttributeType': 'S'},
+                {'AttributeName': 'user_id', 'AttributeType': 'S'},
+                {'AttributeName': 'created_at', 'AttributeType': 'S'},
+                *_TITLE_INDEX_ATTRIBUTES
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': 'user_id-created_at-index',
+                    'KeySchema': [
+                        {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+                        {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
                     ],
-                    BillingMode='PROVISIONED',
-                    ProvisionedThroughput={
+                    'Projection': {'ProjectionType': 'ALL'},
+                    'ProvisionedThroughput': {
                         'ReadCapacityUnits': 5,
                         'WriteCapacityUnits': 5
                     }
-                )
-                table.wait_until_exists()
-                logger.info(f"Created table {self.table_name}")
-                return True
-            except ClientError as e:
-                logger.error(f"Error creating table: {str(e)}")
+                },
+                _TITLE_INDEX
+            ],
+            BillingMode='PROVISIONED',
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        )
+        return created and self.ensure_title_index() and self._ensure_table(
+            self.tags_table_name,
+            KeySchema=[
+                {'AttributeName': 'user_tag', 'KeyType': 'HASH'},
+                {'AttributeName': 'tagged', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'user_tag', 'AttributeType': 'S'},
+                {'AttributeName': 'tagged', 'AttributeType': 'S'}
+            ],
+            BillingMode='PROVISIONED',
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        )
+    
+    def ensure_title_index(self, poll_interval: float = 5, max_polls: int = 360) -> bool:
+        """
+        Add the title search index to a metadata table created before it existed,
+        waiting for DynamoDB to finish building it
+        Returns: True once the index is active
+        """
+        try:
+            for _ in range(max_polls):
+                table = self.dynamodb_client.describe_table(TableName=self.table_name)['Table']
+                status = next((index['IndexStatus'] for index in table.get('GlobalSecondaryIndexes', [])
+                               if index['IndexName'] == _TITLE_INDEX_NAME), None)
+                if status == 'ACTIVE':
+                    return True
+                if status is None:
+                    index = dict(_TITLE_INDEX)
+                    if table.get('BillingModeSummary', {}).get('BillingMode') == 'PAY_PER_REQUEST':
+                        del index['ProvisionedThroughput']
+                    self.dynamodb_client.update_table(
+                        TableName=self.table_name,
+                        AttributeDefinitions=_TITLE_INDEX_ATTRIBUTES,
+                        GlobalSecondaryIndexUpdates=[{'Create': index}]
+                    )
+                    logger.info("Creating index %s on %s", _TITLE_INDEX_NAME, self.table_name)
+                else:
+                    time.sleep(poll_interval)
+            logger.error("Index %s on %s is still not active", _TITLE_INDEX_NAME, self.table_name)
+            return False
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error adding title index: %s", e)
+            return False
+    
+    @staticmethod
+    def _title_keys(title: str, image_id: str) -> Dict[str, str]:
+        """
+        Build the title index attributes: the first two characters of the normalized
+        title spread titles across partitions, and the sort key supports prefix search
+        Returns: the attributes, or {} for a blank title (left out of the index)
+        """
+        normalized = title.strip().lower()
+        if not normalized:
+            return {}
+        return {
+            'title_normalized': normalized,
+            'title_prefix': normalized[:2],
+            # image_id is a UUIDv7: inverted, equal titles sort newest first
+            'title_sort': f"{normalized}#{image_id.translate(_NEWEST_FIRST)}"
+        }
+    
+    @staticmethod
+    def _tag_rows(user_id: str, image_id: str, created_at: str, tags: Iterable[str]) -> List[Dict[str, str]]:
+        """Build the tag index rows for an image, one per distinct tag"""
+        return [
+            {'user_tag': f"{user_id}#{tag}", 'tagged': f"{created_at}#{image_id}", 'image_id': image_id}
+            for tag in set(tags)
+        ]
+    
+    def _batch_write(self, table_name: str, requests: List[Dict[str, Any]]) -> bool:
+        """
+        Send write requests 25 per BatchWriteItem, retrying unprocessed ones
+        Returns: True if every request was processed
+        """
+        for start in range(0, len(requests), 25):
+            request_items = {table_name: requests[start:start + 25]}
+            for attempt in range(_BATCH_MAX_ATTEMPTS):
+                response = self.dynamodb_client.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems')
+                if not request_items:
+                    break
+                time.sleep(random.uniform(0, min(0.05 * 2 ** attempt, 1.0)))
+            else:
+                logger.warning("Gave up on unprocessed writes to %s after %d attempts",
+                               table_name, _BATCH_MAX_ATTEMPTS)
                 return False
+        return True
+    
+    def _write_tag_rows(self, put: Iterable[Dict[str, str]] = (), delete: Iterable[Dict[str, str]] = ()) -> bool:
+        """
+        Add and remove tag index rows in batches. Best-effort: the primary write has
+        already committed by now, so a failure here is logged rather than raised
+        Returns: True if every row was written
+        """
+        try:
+            return self._batch_write(self.tags_table_name, [
+                *({'PutRequest': {'Item': self._serialize(row)}} for row in put),
+                *({'DeleteRequest': {'Key': self._serialize({'user_tag': row['user_tag'], 'tagged': row['tagged']})}}
+                  for row in delete)
+            ])
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error updating tag index %s: %s", self.tags_table_name, e)
+            return False
+    
+    def _scan_items(self, *attributes: str) -> Iterator[Dict[str, Any]]:
+        """Yield every item of the metadata table, projected to the given attributes"""
+        kwargs = {
+            'TableName': self.table_name,
+            'ProjectionExpression': ', '.join(f"#a{i}" for i in range(len(attributes))),
+            'ExpressionAttributeNames': {f"#a{i}": name for i, name in enumerate(attributes)}
+        }
+        while True:
+            response = self.dynamodb_client.scan(**kwargs)
+            yield from map(self._deserialize, response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            kwargs['ExclusiveStartKey'] = last_key
+    
+    def backfill_tag_index(self) -> int:
+        """
+        Write tag index rows for every image, e.g. ones saved before the tags table existed
+        Returns: number of images indexed, or -1 on error
+        """
+        indexed = 0
+        try:
+            for page in _batched(self._scan_items('image_id', 'user_id', 'created_at', 'tags'), 100):
+                rows = [row for item in page
+                        for row in self._tag_rows(item['user_id'], item['image_id'],
+                                                  item['created_at'], item.get('tags', []))]
+                if not self._batch_write(self.tags_table_name,
+                                         [{'PutRequest': {'Item': self._serialize(row)}} for row in rows]):
+                    return -1
+                indexed += len(page)
+            logger.info("Backfilled tag index for %s images", indexed)
+            return indexed
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error backfilling tag index: %s", e)
+            return -1
+    
+    def backfill_title_index(self) -> int:
+        """
+        Write the title index attributes for images saved before the title index
+        existed, or with an older title_sort format
+        Returns: number of images indexed, or -1 on error
+        """
+        indexed = 0
+        try:
+            for item in self._scan_items('image_id', 'user_id', 'title', 'title_sort'):
+                title_keys = self._title_keys(item.get('title', ''), item['image_id'])
+                if not title_keys or item.get('title_sort') == title_keys['title_sort']:
+                    continue
+                try:
+                    self.dynamodb_client.update_item(
+                        TableName=self.table_name,
+                        Key=self._serialize({'image_id': item['image_id'], 'user_id': item['user_id']}),
+                        UpdateExpression='SET ' + ', '.join(f"{name} = :{name}" for name in title_keys),
+                        # Skip rows deleted or retitled since the scan read them
+                        ConditionExpression='attribute_exists(image_id) AND title = :title',
+                        ExpressionAttributeValues=self._serialize({
+                            ':title': item['title'],
+                            **{f":{name}": value for name, value in title_keys.items()}
+                        })
+                    )
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                        raise
+                    continue
+                self._invalidate(item['user_id'], item['image_id'])
+                indexed += 1
+            logger.info("Backfilled title index for %s images", indexed)
+            return indexed
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error backfilling title index: %s", e)
+            return -1
     
     def save_metadata(self, user_id: str, image_id: str, s3_key: str, 
                      title: str, description: str, tags: List[str]) -> bool:
         """Save image metadata to DynamoDB"""
+        return self.save_metadata_bulk([{
+            'image_id': image_id,
+            'user_id': user_id,
+            's3_key': s3_key,
+            'title': title,
+            'description': description,
+            'tags': tags
+        }]) == 1
+    
+    def save_metadata_bulk(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Save many images' metadata with BatchWriteItem, 25 items per request
+        Returns: number of distinct images saved (0 on failure)
+        """
         try:
-            table = self.dynamodb.Table(self.table_name)
-            table.put_item(
-                Item={
-                    'image_id': image_id,
-                    'user_id': user_id,
-                    's3_key': s3_key,
-                    'title': title,
-                    'description': description,
-                    'tags': tags,
-                    'created_at': datetime.utcnow().isoformat(),
-                    'updated_at': datetime.utcnow().isoformat()
-                }
-            )
-            logger.info(f"Saved metadata for image {image_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Error saving metadata: {str(e)}")
-            return False
+            now = _utcnow_iso()
+            # BatchWriteItem rejects repeated keys within a request; the last record wins
+            latest = {(record['image_id'], record['user_id']): record for record in records}
+            saved = self._batch_write(self.table_name, [
+                {'PutRequest': {'Item': self._serialize({
+                    **record,
+                    **self._title_keys(record['title'], record['image_id']),
+                    'created_at': now,
+                    'updated_at': now
+                })}}
+                for record in latest.values()
+            ])
+            if not saved:
+                return 0
+            self._write_tag_rows(put=[
+                row for record in latest.values()
+                for row in self._tag_rows(record['user_id'], record['image_id'], now, record.get('tags', []))
+            ])
+            for user_id in {record['user_id'] for record in latest.values()}:
+                self._invalidate(user_id)
+            logger.info("Saved metadata for %s images", len(latest))
+            return len(latest)
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error saving metadata: %s", e)
+            return 0
     
     def get_image_metadata(self, image_id: str, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get image metadata from DynamoDB"""
+        """Get image metadata, checking the cache (Redis, or the opt-in local one) before DynamoDB"""
+        cache_key = (image_id, user_id)
+        item = None
+        if self._local_caching:
+            with self._cache_lock:
+                item = self._metadata_cache.get(cache_key)
+            if item is not None:
+                return dict(item)
+        elif self.redis is not None:
+            try:
+                cached = self.redis.get(self._redis_key(image_id, user_id))
+                if cached is not None:
+                    item = json.loads(cached)
+            except _REDIS_ERRORS as e:
+                logger.error("Error reading cached metadata: %s", e)
+        
         try:
-            table = self.dynamodb.Table(self.table_name)
-            response = table.get_item(
-                Key={'image_id': image_id, 'user_id': user_id}
-            )
-            return response.get('Item')
-        except Exception as e:
-            logger.error(f"Error retrieving metadata: {str(e)}")
+            if item is None:
+                response = self.dynamodb_client.get_item(
+                    TableName=self.table_name,
+                    Key=self._key(image_id, user_id)
+                )
+                if 'Item' not in response:
+                    return None
+                item = self._deserialize(response['Item'])
+                if self.redis is not None:
+                    try:
+                        self.redis.setex(self._redis_key(image_id, user_id),
+                                         METADATA_CACHE_TTL, json.dumps(item, default=str))
+                    except _REDIS_ERRORS as e:
+                        logger.error("Error caching metadata: %s", e)
+            if self._local_caching:
+                with self._cache_lock:
+                    self._metadata_cache[cache_key] = item
+            return dict(item)
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error retrieving metadata: %s", e)
             return None
     
+    def get_metadata_batch(self, keys: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Get metadata for many (image_id, user_id) pairs, 100 keys per BatchGetItem
+        Returns: the items found, in no particular order
+        """
+        items = []
+        unique_keys = list(dict.fromkeys(keys))  # BatchGetItem rejects duplicate keys
+        try:
+            for start in range(0, len(unique_keys), 100):
+                request_items = {self.table_name: {'Keys': [
+                    self._key(image_id, user_id)
+                    for image_id, user_id in unique_keys[start:start + 100]
+                ]}}
+                for attempt in range(_BATCH_MAX_ATTEMPTS):
+                    response = self.dynamodb_client.batch_get_item(RequestItems=request_items)
+                    items.extend(map(self._deserialize, response.get('Responses', {}).get(self.table_name, [])))
+                    request_items = response.get('UnprocessedKeys')
+                    if not request_items:
+                        break
+                    # Throttled keys come back unprocessed; back off (with full
+                    # jitter, so concurrent callers spread out) before retrying them
+                    time.sleep(random.uniform(0, min(0.05 * 2 ** attempt, 1.0)))
+                else:
+                    logger.warning("Gave up on unprocessed keys in %s after %d attempts",
+                                   self.table_name, _BATCH_MAX_ATTEMPTS)
+            return items
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error batch retrieving metadata: %s", e)
+            return []
+    
+    def iter_images_by_user(self, user_id: str, page_size: int = 50) -> Iterator[Dict[str, Any]]:
+        """Yield a user's images newest first, fetching further pages only as they are consumed"""
+        kwargs = {
+            'TableName': self.table_name,
+            'IndexName': 'user_id-created_at-index',
+            'KeyConditionExpression': 'user_id = :user_id',
+            'ExpressionAttributeValues': {':user_id': {'S': user_id}},
+            'ScanIndexForward': False,  # Order by creation time descending
+            'Limit': page_size
+        }
+        while True:
+            response = self.dynamodb_client.query(**kwargs)
+            yield from map(self._deserialize, response.get('Items', []))
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                break
+            kwargs['ExclusiveStartKey'] = last_key
+    
     def list_images_by_user(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """List all images for a user"""
+        """List all images for a user (briefly cached per user and limit when local caching is enabled)"""
+        cache_key = (user_id, limit)
+        if self._local_caching:
+            with self._cache_lock:
+                items = self._list_cache.get(cache_key)
+            if items is not None:
+                return [dict(item) for item in items]
         try:
-            table = self.dynamodb.Table(self.table_name)
-            response = table.query(
-                IndexName='user_id-created_at-index',
-                KeyConditionExpression='user_id = :user_id',
-                ExpressionAttributeValues={':user_id': user_id},
-                ScanIndexForward=False,  # Order by creation time descending
-                Limit=limit
-            )
-            return response.get('Items', [])
-        except Exception as e:
-            logger.error(f"Error listing images: {str(e)}")
+            # Pages match the limit, so the first page usually suffices
+            items = list(itertools.islice(self.iter_images_by_user(user_id, page_size=limit), limit))
+            if self._local_caching:
+                with self._cache_lock:
+                    self._list_cache[cache_key] = items
+            return [dict(item) for item in items]
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error listing images: %s", e)
             return []
     
     def search_images_by_title(self, title: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Search images by title"""
+        """
+        Search images whose title starts with the given text, ignoring case
+        Returns: matching items in title order, equal titles newest first
+        ([] for searches shorter than MIN_TITLE_SEARCH_LENGTH)
+        """
+        keys = self._title_keys(title, '')
+        if len(keys.get('title_normalized', '')) < MIN_TITLE_SEARCH_LENGTH:
+            return []
         try:
-            table = self.dynamodb.Table(self.table_name)
-            response = table.query(
-                IndexName='title-created_at-index',
-                KeyConditionExpression='title = :title',
-                ExpressionAttributeValues={':title': title},
-                ScanIndexForward=False,
+            response = self.dynamodb_client.query(
+                TableName=self.table_name,
+                IndexName=_TITLE_INDEX_NAME,
+                KeyConditionExpression='title_prefix = :prefix AND begins_with(title_sort, :title)',
+                ExpressionAttributeValues={
+                    ':prefix': {'S': keys['title_prefix']},
+                    ':title': {'S': keys['title_normalized']}
+                },
                 Limit=limit
             )
-            return response.get('Items', [])
-        except Exception as e:
-            logger.error(f"Error searching by title: {str(e)}")
+            return [self._deserialize(item) for item in response.get('Items', [])]
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error searching by title: %s", e)
             return []
     
     def search_images_by_tags(self, user_id: str, tags: List[str], limit: int = 10) -> List[Dict[str, Any]]:
-        """Search images by tags"""
-        try:
-            table = self.dynamodb.Table(self.table_name)
-            # First get all images for the user, then filter by tags
-            response = table.query(
-                IndexName='user_id-created_at-index',
-                KeyConditionExpression='user_id = :user_id',
-                ExpressionAttributeValues={':user_id': user_id},
+        """Search images currently having any of the tags, newest first, via the tag index table"""
+        def query_tag(tag):
+            return self.dynamodb_client.query(
+                TableName=self.tags_table_name,
+                KeyConditionExpression='user_tag = :user_tag',
+                ExpressionAttributeValues={':user_tag': {'S': f"{user_id}#{tag}"}},
+                ProjectionExpression='image_id, tagged',
                 ScanIndexForward=False,
-                Limit=limit * 2  # Get more items to filter
-            )
-            
-            items = response.get('Items', [])
-            filtered_items = []
-            for item in items:
-                item_tags = set(item.get('tags', []))
-                if any(tag in item_tags for tag in tags):
-                    filtered_items.append(item)
-                if len(filtered_items) >= limit:
-                    break
-            return filtered_items
-        except Exception as e:
-            logger.error(f"Error searching by tags: {str(e)}")
+                Limit=limit
+            ).get('Items', [])
+        
+        try:
+            # One key query per tag, in parallel; an image matching several tags counts once
+            wanted = set(tags)
+            index_rows = {}
+            for tag, rows in zip(wanted, _IO_POOL.map(query_tag, wanted)):
+                for row in rows:
+                    index_rows.setdefault(row['image_id']['S'], []).append(
+                        {'user_tag': f"{user_id}#{tag}", 'tagged': row['tagged']['S'], 'tag': tag})
+            image_ids = sorted(index_rows, key=lambda image_id: index_rows[image_id][0]['tagged'],
+                               reverse=True)[:limit]
+            found = {item['image_id']: item
+                     for item in self.get_metadata_batch([(image_id, user_id) for image_id in image_ids])}
+            # Index upkeep is best-effort, so rows can outlive a tag (or the image):
+            # keep only images that still carry a requested tag, and drop stale rows
+            matches, stale = [], []
+            for image_id in image_ids:
+                item = found.get(image_id)
+                current = set(item.get('tags', [])) if item else set()
+                stale.extend(row for row in index_rows[image_id] if row['tag'] not in current)
+                if current & wanted:
+                    matches.append(item)
+            if stale:
+                self._write_tag_rows(delete=stale)
+            return matches
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error searching by tags: %s", e)
             return []
     
-    def delete_metadata(self, image_id: str, user_id: str) -> bool:
-        """Delete image metadata from DynamoDB"""
+    def delete_metadata(self, image_id: str,
+                        user_id: str) -> Union[Dict[str, Any], _NotFound, None]:
+        """
+        Delete image metadata from DynamoDB if the image exists for this user
+        Returns: the deleted item, NOT_FOUND if there was none, None on error
+        """
         try:
-            table = self.dynamodb.Table(self.table_name)
-            table.delete_item(
-                Key={'image_id': image_id, 'user_id': user_id}
+            response = self.dynamodb_client.delete_item(
+                TableName=self.table_name,
+                Key=self._key(image_id, user_id),
+                ConditionExpression='attribute_exists(image_id)',
+                ReturnValues='ALL_OLD'
             )
-            logger.info(f"Deleted metadata for image {image_id}")
-            return True
-        except Exception as e:
-            logger.error(f"Error deleting metadata: {str(e)}")
-            return False
+            deleted = self._deserialize(response['Attributes'])
+            self._write_tag_rows(delete=self._tag_rows(
+                user_id, image_id, deleted['created_at'], deleted.get('tags', [])))
+            self._invalidate(user_id, image_id)
+            logger.info("Deleted metadata for image %s", image_id)
+            return deleted
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return NOT_FOUND
+            logger.error("Error deleting metadata: %s", e)
+            return None
+        except BotoCoreError as e:
+            logger.error("Error deleting metadata: %s", e)
+            return None
     
     def update_metadata(self, image_id: str, user_id: str, 
                        title: Optional[str] = None, 
                        description: Optional[str] = None,
-                       tags: Optional[List[str]] = None) -> bool:
-        """Update image metadata"""
+                       tags: Optional[List[str]] = None) -> Union[bool, _NotFound]:
+        """
+        Update image metadata if the image exists for this user
+        Returns: True on success, NOT_FOUND if there is no such image, False on error
+        """
         try:
-            table = self.dynamodb.Table(self.table_name)
+            if title is None and description is None and tags is None:
+                # Nothing to write; a keys-only read answers instead of spending a WCU
+                response = self.dynamodb_client.get_item(
+                    TableName=self.table_name,
+                    Key=self._key(image_id, user_id),
+                    ProjectionExpression='image_id'
+                )
+                return True if 'Item' in response else NOT_FOUND
+            
             update_expr = "SET updated_at = :updated_at"
-            expr_values = {':updated_at': datetime.utcnow().isoformat()}
+            expr_values = {':updated_at': _utcnow_iso()}
             
-            if title:
+            remove = []
+            if title is not None:
                 update_expr += ", title = :title"
                 expr_values[':title'] = title
-            if description:
+                title_keys = self._title_keys(title, image_id)
+                for name, value in title_keys.items():
+                    update_expr += f", {name} = :{name}"
+                    expr_values[f':{name}'] = value
+                if not title_keys:
+                    remove = ['title_normalized', 'title_prefix', 'title_sort']
+            if description is not None:
                 update_expr += ", description = :description"
                 expr_values[':description'] = description
-            if tags:
+            if tags is not None:
                 update_expr += ", tags = :tags"
                 expr_values[':tags'] = tags
+            if remove:
+                update_expr += " REMOVE " + ", ".join(remove)
             
-            table.update_item(
-                Key={'image_id': image_id, 'user_id': user_id},
+            response = self.dynamodb_client.update_item(
+                TableName=self.table_name,
+                Key=self._key(image_id, user_id),
                 UpdateExpression=update_expr,
-                ExpressionAttributeValues=expr_values
+                ConditionExpression='attribute_exists(image_id)',
+                ExpressionAttributeValues=self._serialize(expr_values),
+                ReturnValues='ALL_OLD'
             )
-            logger.info(f"Updated metadata for image {image_id}")
+            if tags is not None:
+                # Re-put a row for every current tag (puts are idempotent, and this
+                # heals images saved before the index existed); drop dropped tags
+                old = self._deserialize(response['Attributes'])
+                self._write_tag_rows(
+                    put=self._tag_rows(user_id, image_id, old['created_at'], tags),
+                    delete=self._tag_rows(user_id, image_id, old['created_at'],
+                                          set(old.get('tags', [])) - set(tags))
+                )
+            self._invalidate(user_id, image_id)
+            logger.info("Updated metadata for image %s", image_id)
             return True
-        except Exception as e:
-            logger.error(f"Error updating metadata: {str(e)}")
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return NOT_FOUND
+            logger.error("Error updating metadata: %s", e)
+            return False
+        except BotoCoreError as e:
+            logger.error("Error updating metadata: %s", e)
             return False
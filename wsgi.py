@@ -0,0 +1,18 @@
+"""Production entry point serving the app on gevent's cooperative event loop"""
+from gevent import monkey
+
+# Patch sockets/threads before boto3 is imported so every in-flight S3 and
+# DynamoDB call yields to the event loop instead of blocking a worker thread.
+monkey.patch_all()
+
+import gevent
+
+from app import app, warm_up_connections
+
+# Each worker imports this module, so each warms its own connection pools
+gevent.spawn(warm_up_connections)
+
+if __name__ == '__main__':
+    from gevent.pywsgi import WSGIServer
+
+    WSGIServer(('0.0.0.0', 5000), app).serve_forever()